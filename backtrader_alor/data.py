@@ -1,9 +1,11 @@
 import csv
 import logging
 import os.path
+from collections import deque, namedtuple
 from datetime import datetime, time, timedelta
 from pathlib import Path
 from threading import Event, Thread  # Поток и событие остановки потока получения новых бар по расписанию биржи
+from time import monotonic  # Время для кэширования текущего биржевого времени
 from uuid import uuid4  # Номера расписаний должны быть уникальными во времени и пространстве
 
 from backtrader import TimeFrame, date2num
@@ -12,6 +14,19 @@ from backtrader.utils.py3 import with_metaclass
 
 from .store import Store
 
+Bar = namedtuple("Bar", "datetime open high low close volume")  # Бар из файла/истории/подписки/расписания
+
+# ВременнЫе интервалы BackTrader, не зависящие от размера временнОго интервала
+ALOR_TIMEFRAMES = {TimeFrame.Days: "D", TimeFrame.Weeks: "W", TimeFrame.Months: "M", TimeFrame.Years: "Y"}  # Алор
+TFS = {TimeFrame.Days: "D1", TimeFrame.Weeks: "W1", TimeFrame.Months: "MN1", TimeFrame.Years: "Y1"}  # Имя файла
+# Длительность бара. Для месячного и годового временнОго интервала зависит от даты открытия бара
+BAR_TIMEDELTAS = {
+    TimeFrame.Days: timedelta(days=1),
+    TimeFrame.Weeks: timedelta(weeks=1),
+    TimeFrame.Months: None,
+    TimeFrame.Years: None,
+}
+
 
 class MetaData(AbstractDataBase.__class__):
     def __init__(self, name, bases, dct):
@@ -30,6 +45,7 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
     )
     delimiter = ","  # Разделитель значений в файле истории. По умолчанию табуляция
     dt_format = "%d.%m.%Y %H:%M"  # Формат представления даты и времени в файле истории. По умолчанию русский формат
+    time_now_ttl = 0.5  # Время в секундах, в течение которого используется полученное текущее биржевое время
 
     def islive(self):
         """Если подаем новые бары, то Cerebro не будет запускать preload и runonce, т.к. новые бары должны идти один
@@ -48,6 +64,12 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
         self.store = Store()
         # Внутридневной временной интервал. Алор измеряет внутридневные интервалы в секундах
         self.intraday = self.p.timeframe in (TimeFrame.Minutes, TimeFrame.Seconds)
+        # Перевод timestamp в дату и время открытия бара. Из GMT в MSK для интрадея. Оставляем в GMT для дневок и выше
+        self.timestamp_to_bar_open_date_time = (
+            self.store.provider.utc_timestamp_to_msk_datetime if self.intraday else datetime.utcfromtimestamp
+        )
+        # Длительность бара. Для месячного и годового временнОго интервала непостоянная
+        self.bar_timedelta = self.bt_timeframe_to_timedelta(self.p.timeframe, self.p.compression)
         # По тикеру получаем код режима торгов и тикера
         self.board, self.symbol = self.store.provider.dataname_to_board_symbol(self.p.dataname)
         # Биржа тикера. В Алор запросы выполняются по коду биржи и тикера
@@ -60,12 +82,21 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
         self.file = f"{self.board}.{self.symbol}_{self.tf}"  # Имя файла истории
         self.logger = logging.getLogger(f"Data.{self.file}")  # Будем вести лог
         self.file_name = cache_path / f"{self.file}.csv"  # Полное имя файла истории
-        self.history_bars = []  # Исторические бары из файла и истории после проверки на соответствие условиям выборки
+        # Исторические бары из файла и истории после проверки на соответствие условиям выборки
+        self.history_bars = deque()
         self.guid = None  # Идентификатор подписки/расписания на историю цен
+        self.new_bars = deque()  # Очередь новых бар из хранилища по guid подписки/расписания
         self.exit_event = Event()  # Определяем событие выхода из потока
         self.dt_last_open = datetime.min  # Дата и время открытия последнего полученного бара
+        self.last_bar_timestamp = 0  # Время открытия последнего полученного нового бара в секундах UTC
         self.last_bar_received = False  # Получен последний бар
         self.live_mode = False  # Режим получения бар. False = История, True = Новые бары
+        # Время получения, источник (last_bar_received) и значение последнего текущего биржевого времени
+        self.time_now_cache = (0.0, False, None)
+        self.check_sessionstart = False  # Задано время начала сессии. Вычисляется при получении бар
+        self.check_sessionend = False  # Задано время окончания сессии. Вычисляется при получении бар
+        self.history_loaded = False  # Бары из файла и истории получены
+        self.bar_lines = ()  # Линии бара. Получаем при запуске
 
     def setenvironment(self, env):
         """Добавление хранилища Алор в cerebro"""
@@ -74,9 +105,24 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
 
     def start(self):
         super(Data, self).start()
+        lines = self.lines  # Линии не меняются после запуска. Получаем их один раз, а не для каждого бара
+        self.bar_lines = (
+            lines.datetime,
+            lines.open,
+            lines.high,
+            lines.low,
+            lines.close,
+            lines.volume,
+            lines.openinterest,
+        )
         self.put_notification(self.DELAYED)  # Отправляем уведомление об отправке исторических (не новых) бар
-        self.get_bars_from_file()  # Получаем бары из файла
-        self.get_bars_from_history()  # Получаем бары из истории
+        if not self.history_loaded:  # Если бары не были получены заранее
+            # то получаем их заранее по всем данным Алор запущенного cerebro, которые еще их не получили
+            self.store.preload_histories(
+                [data for data in self.getenvironment().datas if isinstance(data, Data) and not data.history_loaded]
+            )
+        if not self.history_loaded:  # Если бары так и не были получены заранее
+            self.load_history()  # то получаем их сейчас
         if len(self.history_bars) > 0:  # Если был получен хотя бы 1 бар
             self.put_notification(
                 self.CONNECTED
@@ -84,6 +130,7 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
         if self.p.live_bars:  # Если получаем историю и новые бары
             if self.p.schedule:  # Если получаем новые бары по расписанию
                 self.guid = str(uuid4())  # guid расписания
+                self.new_bars = self.store.new_bars.setdefault(self.guid, deque())  # Очередь новых бар расписания
                 Thread(
                     target=self.stream_bars
                 ).start()  # Создаем и запускаем получение новых бар по расписанию в потоке
@@ -101,6 +148,7 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
                 self.guid = self.store.provider.bars_get_and_subscribe(
                     self.exchange, self.symbol, self.alor_timeframe, seconds_from, frequency=1_000_000_000
                 )  # Подписываемся на бары, получаем guid подписки
+                self.new_bars = self.store.new_bars.setdefault(self.guid, deque())  # Очередь новых бар подписки
                 self.logger.debug(f"Код подписки {self.guid}")
 
     def _load(self) -> bool | None:
@@ -113,28 +161,25 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
             return False  # Больше сюда заходить не будем
 
         if len(self.history_bars) > 0:  # Если есть исторические данные
-            bar = self.history_bars.pop(0)  # Берем и удаляем первый бар из хранилища. С ним будем работать
-        else:  # Если получаем историю и новые бары (self.store.new_bars)
-            if len(self.store.new_bars) == 0:  # Если в хранилище никаких новых бар нет
-                return None  # то нового бара нет, будем заходить еще
-            new_bars = [
-                new_bar for new_bar in self.store.new_bars if new_bar["guid"] == self.guid
-            ]  # Смотрим в хранилище новых бар бары с guid подписки
-            if len(new_bars) == 0:  # Если новый бар еще не появился
-                self.logger.debug("Новых бар нет")
+            bar = self.history_bars.popleft()  # Берем и удаляем первый бар из хранилища. С ним будем работать
+        else:  # Если получаем историю и новые бары (self.new_bars)
+            if not self.new_bars:  # Если в очереди подписки/расписания новых бар нет
                 return None  # то нового бара нет, будем заходить еще
+            new_bar = self.new_bars.popleft()  # Берем и удаляем первый бар из очереди. С ним будем работать
 
-            # Если в хранилище остался 1 бар, то мы будем получать последний возможный бар
-            self.last_bar_received = len(new_bars) == 1
+            # Если в очереди не осталось бар, то мы получили последний возможный бар
+            self.last_bar_received = not self.new_bars
             if self.last_bar_received:  # Получаем последний возможный бар
                 self.logger.debug("Получение последнего возможного на данный момент бара")
-            new_bar = new_bars[0]  # Берем первый бар из хранилища
-            self.store.new_bars.remove(new_bar)  # Убираем его из хранилища
-            new_bar = new_bar["data"]  # С данными этого бара будем работать
-            dt_open = self.get_bar_open_date_time(new_bar["time"])  # Дата и время открытия бара
+            timestamp = new_bar["time"]  # Время открытия бара в секундах UTC
+            if timestamp <= self.last_bar_timestamp:  # Если пришел бар из прошлого
+                self.logger.debug(f"Время открытия бара {timestamp} <= последнего времени открытия")
+                return None  # то пропускаем бар без перевода времени в дату, будем заходить еще
+            self.last_bar_timestamp = timestamp  # Запоминаем время открытия пришедшего бара для будущих сравнений
+            dt_open = self.get_bar_open_date_time(timestamp)  # Дата и время открытия бара
 
             # Бар из хранилища новых бар
-            bar = dict(
+            bar = Bar(
                 datetime=dt_open,
                 open=new_bar["open"],
                 high=new_bar["high"],
@@ -146,7 +191,7 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
             if not self.is_bar_valid(bar):  # Если бар не соответствует всем условиям выборки
                 return None  # то пропускаем бар, будем заходить еще
 
-            self.logger.debug(f'Сохранение нового бара с {bar["datetime"].strftime(self.dt_format)} в файл')
+            self.logger.debug(f"Сохранение нового бара с {bar.datetime.strftime(self.dt_format)} в файл")
             self.save_bar_to_file(bar)  # Сохраняем бар в конец файла
 
             if self.last_bar_received and not self.live_mode:
@@ -158,29 +203,43 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
                 self.live_mode = False  # Переходим в режим получения истории
 
         # Все проверки пройдены. Записываем полученный исторический/новый бар
-        self.lines.datetime[0] = date2num(bar["datetime"])  # DateTime
-        self.lines.open[0] = self.store.provider.alor_price_to_price(self.exchange, self.symbol, bar["open"])  # Open
-        self.lines.high[0] = self.store.provider.alor_price_to_price(self.exchange, self.symbol, bar["high"])  # High
-        self.lines.low[0] = self.store.provider.alor_price_to_price(self.exchange, self.symbol, bar["low"])  # Low
-        self.lines.close[0] = self.store.provider.alor_price_to_price(self.exchange, self.symbol, bar["close"])  # Close
-        self.lines.volume[0] = bar["volume"]  # Volume
-        self.lines.openinterest[0] = 0  # Открытый интерес в Алор не учитывается
+        line_datetime, line_open, line_high, line_low, line_close, line_volume, line_openinterest = self.bar_lines
+        alor_price_to_price = self.store.provider.alor_price_to_price  # Перевод цены Алор в цену
+        exchange, symbol = self.exchange, self.symbol  # Биржа и тикер
+        line_datetime[0] = date2num(bar.datetime)  # DateTime
+        line_open[0] = alor_price_to_price(exchange, symbol, bar.open)  # Open
+        line_high[0] = alor_price_to_price(exchange, symbol, bar.high)  # High
+        line_low[0] = alor_price_to_price(exchange, symbol, bar.low)  # Low
+        line_close[0] = alor_price_to_price(exchange, symbol, bar.close)  # Close
+        line_volume[0] = bar.volume  # Volume
+        line_openinterest[0] = 0  # Открытый интерес в Алор не учитывается
 
         return True  # Будем заходить сюда еще
 
     def stop(self):
         super(Data, self).stop()
+        self.history_loaded = False  # При следующем запуске бары нужно будет получить заново
         if self.p.live_bars:  # Если была подписка/расписание
             if self.p.schedule:  # Если получаем новые бары по расписанию
                 self.exit_event.set()  # то отменяем расписание
             else:  # Если получаем новые бары по подписке
                 self.logger.info(f"Отмена подписки {self.guid} на новые бары")
                 self.store.provider.unsubscribe(self.guid)  # то отменяем подписку
+            self.store.new_bars.pop(self.guid, None)  # Удаляем очередь новых бар из хранилища
             self.put_notification(self.DISCONNECTED)  # Отправляем уведомление об окончании получения новых бар
         self.store.DataCls = None  # Удаляем класс данных в хранилище
 
     # Получение бар
 
+    def load_history(self) -> None:
+        """Получение бар из файла и истории. Может вызываться хранилищем из другого потока до запуска данных"""
+        # Значения по умолчанию для времени начала/окончания сессии BackTrader ставит после __init__
+        self.check_sessionstart = self.p.sessionstart != time.min  # Задано время начала сессии
+        self.check_sessionend = self.p.sessionend != time(23, 59, 59, 999990)  # Задано время окончания сессии
+        self.get_bars_from_file()  # Получаем бары из файла
+        self.get_bars_from_history()  # Получаем бары из истории
+        self.history_loaded = True  # Бары получены
+
     def get_bars_from_file(self) -> None:
         """Получение бар из файла"""
         if not os.path.isfile(self.file_name):  # Если файл не существует
@@ -189,22 +248,26 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
         with open(self.file_name) as file:  # Открываем файл на последовательное чтение
             reader = csv.reader(file, delimiter=self.delimiter)  # Данные в строке разделены табуляцией
             next(reader, None)  # Пропускаем первую строку с заголовками
-            for csv_row in reader:  # Последовательно получаем все строки файла
-                bar = dict(
+            is_bar_valid = self.is_bar_valid  # Проверка бара на соответствие условиям выборки
+            time_market_now = self.get_alor_date_time_now()  # Текущее биржевое время. Одно на все бары из файла
+            bars = (
+                Bar(
                     datetime=datetime.strptime(csv_row[0], self.dt_format),
                     open=float(csv_row[1]),
                     high=float(csv_row[2]),
                     low=float(csv_row[3]),
                     close=float(csv_row[4]),
                     volume=int(csv_row[5]),
-                )  # Бар из файла
-                if self.is_bar_valid(bar):  # Если исторический бар соответствует всем условиям выборки
-                    self.history_bars.append(bar)  # то добавляем бар
+                )
+                for csv_row in reader
+            )  # Бары из файла
+            # Добавляем бары, соответствующие всем условиям выборки
+            self.history_bars.extend(bar for bar in bars if is_bar_valid(bar, time_market_now))
         if len(self.history_bars) > 0:  # Если были получены бары из файла
             self.logger.debug(
                 f"Получено бар из файла: {len(self.history_bars)} с "
-                f'{self.history_bars[0]["datetime"].strftime(self.dt_format)} по '
-                f'{self.history_bars[-1]["datetime"].strftime(self.dt_format)}'
+                f"{self.history_bars[0].datetime.strftime(self.dt_format)} по "
+                f"{self.history_bars[-1].datetime.strftime(self.dt_format)}"
             )
         else:  # Бары из файла не получены
             self.logger.debug("Из файла новых бар не получено")
@@ -231,23 +294,29 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
             self.logger.error(f"Бар (history) нет в словаре {response}")
             return  # то выходим, дальше не продолжаем
         new_bars_dict = response["history"]  # Словарь полученных бар истории
-        for new_bar in new_bars_dict:  # Пробегаемся по всем полученным барам
-            bar = dict(
+        is_bar_valid = self.is_bar_valid  # Проверка бара на соответствие условиям выборки
+        time_market_now = self.get_alor_date_time_now()  # Текущее биржевое время. Одно на все бары из истории
+        bars = (
+            Bar(
                 datetime=self.get_bar_open_date_time(new_bar["time"]),
                 open=new_bar["open"],
                 high=new_bar["high"],
                 low=new_bar["low"],
                 close=new_bar["close"],
                 volume=new_bar["volume"],
-            )  # Бар из истории
-            if self.is_bar_valid(bar):  # Если исторический бар соответствует всем условиям выборки
-                self.history_bars.append(bar)  # то добавляем бар
-                self.save_bar_to_file(bar)  # и сохраняем его в файл
+            )
+            for new_bar in new_bars_dict
+        )  # Бары из истории
+        valid_bars = [
+            bar for bar in bars if is_bar_valid(bar, time_market_now)
+        ]  # Бары, соответствующие всем условиям выборки
+        self.history_bars.extend(valid_bars)  # Добавляем бары
+        self.save_bars_to_file(valid_bars)  # и сохраняем их в файл
         if len(self.history_bars) - file_history_bars_len > 0:  # Если получены бары из истории
             self.logger.debug(
                 f"Получено бар из истории: {len(self.history_bars) - file_history_bars_len} с "
-                f'{self.history_bars[file_history_bars_len]["datetime"].strftime(self.dt_format)} по '
-                f'{self.history_bars[-1]["datetime"].strftime(self.dt_format)}'
+                f"{self.history_bars[file_history_bars_len].datetime.strftime(self.dt_format)} по "
+                f"{self.history_bars[-1].datetime.strftime(self.dt_format)}"
             )
         else:  # Бары из истории не получены
             self.logger.debug("Из истории новых бар не получено")
@@ -292,7 +361,7 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
                 continue  # то будем получать следующий бар
             bar = bars[0]  # Получаем первый (завершенный) бар
             self.logger.debug("Получен бар по расписанию")
-            self.store.new_bars.append(dict(guid=self.guid, data=bar))  # Добавляем в хранилище новых бар
+            self.new_bars.append(bar)  # Добавляем в очередь новых бар расписания
 
     # Функции
 
@@ -304,17 +373,8 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
         :param int compression: Размер временнОго интервала
         :return: Временной интервал Алор
         """
-        if timeframe == TimeFrame.Days:  # Дневной временной интервал (по умолчанию)
-            return "D"
-
-        if timeframe == TimeFrame.Weeks:  # Недельный временной интервал
-            return "W"
-
-        if timeframe == TimeFrame.Months:  # Месячный временной интервал
-            return "M"
-
-        if timeframe == TimeFrame.Years:  # Годовой временной интервал
-            return "Y"
+        if timeframe in ALOR_TIMEFRAMES:  # Дневной (по умолчанию), недельный, месячный, годовой временной интервал
+            return ALOR_TIMEFRAMES[timeframe]
 
         if timeframe == TimeFrame.Minutes:  # Минутный временной интервал
             return str(compression * 60)  # Переводим в секунды
@@ -338,19 +398,27 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
             # Часовой график f'H{compression}' заменяем минутным. Пример: H1 = M60
             return f"M{compression}"
 
-        if timeframe == TimeFrame.Days:  # Дневной временной интервал
-            return "D1"
+        if timeframe in TFS:  # Дневной, недельный, месячный, годовой временной интервал
+            return TFS[timeframe]
 
-        if timeframe == TimeFrame.Weeks:  # Недельный временной интервал
-            return "W1"
+        raise NotImplementedError  # С остальными временнЫми интервалами не работаем
 
-        if timeframe == TimeFrame.Months:  # Месячный временной интервал
-            return "MN1"
+    @staticmethod
+    def bt_timeframe_to_timedelta(timeframe: int, compression: int = 1) -> timedelta | None:
+        """Длительность бара для временнОго интервала из BackTrader
 
-        if timeframe == TimeFrame.Years:  # Годовой временной интервал
-            return "Y1"
+        :param TimeFrame timeframe: Временной интервал
+        :param int compression: Размер временнОго интервала
+        :return: Длительность бара. None для месячного и годового временнОго интервала
+        """
+        if timeframe in BAR_TIMEDELTAS:  # Дневной (по умолчанию), недельный, месячный, годовой временной интервал
+            return BAR_TIMEDELTAS[timeframe]
 
-        raise NotImplementedError  # С остальными временнЫми интервалами не работаем
+        if timeframe == TimeFrame.Seconds:  # Секундный временной интервал
+            return timedelta(seconds=compression)
+
+        # Минутный временной интервал и default value
+        return timedelta(minutes=compression)
 
     def get_seconds_from(self) -> int:
         """Дата и время начала выборки в кол-ве секунд, прошедших с 01.01.1970 00:00 UTC"""
@@ -363,40 +431,30 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
 
     def get_bar_open_date_time(self, timestamp) -> datetime:
         """Дата и время открытия бара. Переводим из GMT в MSK для интрадея. Оставляем в GMT для дневок и выше."""
-        return (
-            self.store.provider.utc_timestamp_to_msk_datetime(timestamp)
-            if self.intraday
-            else datetime.utcfromtimestamp(timestamp)
-        )  # Время открытия бара
+        return self.timestamp_to_bar_open_date_time(timestamp)  # Время открытия бара
 
     def get_bar_close_date_time(self, dt_open, period=1) -> datetime:
         """Дата и время закрытия бара"""
-        if self.p.timeframe == TimeFrame.Days:  # Дневной временной интервал (по умолчанию)
-            return dt_open + timedelta(days=period)  # Время закрытия бара
-
-        if self.p.timeframe == TimeFrame.Weeks:  # Недельный временной интервал
-            return dt_open + timedelta(weeks=period)  # Время закрытия бара
+        if self.bar_timedelta:  # Если длительность бара постоянная
+            return dt_open + self.bar_timedelta * period  # Время закрытия бара
 
         if self.p.timeframe == TimeFrame.Months:  # Месячный временной интервал
             year = dt_open.year + (dt_open.month + period - 1) // 12  # Год
             month = (dt_open.month + period - 1) % 12 + 1  # Месяц
             return datetime(year, month, 1)  # Время закрытия бара
 
-        if self.p.timeframe == TimeFrame.Years:  # Годовой временной интервал
-            return dt_open.replace(year=dt_open.year + period)  # Время закрытия бара
+        # Годовой временной интервал
+        return dt_open.replace(year=dt_open.year + period)  # Время закрытия бара
 
-        if self.p.timeframe == TimeFrame.Minutes:  # Минутный временной интервал
-            return dt_open + timedelta(minutes=self.p.compression * period)  # Время закрытия бара
+    def is_bar_valid(self, bar, time_market_now: datetime | None = None) -> bool:
+        """Проверка бара на соответствие условиям выборки
 
-        if self.p.timeframe == TimeFrame.Seconds:  # Секундный временной интервал
-            return dt_open + timedelta(seconds=self.p.compression * period)  # Время закрытия бара
-
-        # default value
-        return dt_open + timedelta(minutes=self.p.compression * period)
-
-    def is_bar_valid(self, bar) -> bool:
-        """Проверка бара на соответствие условиям выборки"""
-        dt_open = bar["datetime"]  # Дата и время открытия бара МСК
+        :param Bar bar: Бар
+        :param datetime time_market_now: Текущее биржевое время. Если не задано, то получаем его
+        :return: Соответствует ли бар всем условиям выборки
+        """
+        p = self.p  # Параметры получаем один раз на бар
+        dt_open = bar.datetime  # Дата и время открытия бара МСК
         if dt_open <= self.dt_last_open:  # Если пришел бар из прошлого (дата открытия меньше последней даты открытия)
             self.logger.debug(
                 f"Дата/время открытия бара {dt_open} <= последней даты/времени открытия {self.dt_last_open}"
@@ -407,30 +465,29 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
         self.dt_last_open = dt_open  # Запоминаем дату/время открытия пришедшего бара для будущих сравнений
 
         if (
-            self.p.fromdate and dt_open < self.p.fromdate or self.p.todate and dt_open > self.p.todate
+            p.fromdate and dt_open < p.fromdate or p.todate and dt_open > p.todate
         ):  # Если задан диапазон, а бар за его границами
-            # self.logger.debug(f'Дата/время открытия бара {dt_open} за границами диапазона {self.p.fromdate} -
-            # {self.p.todate}')
+            # self.logger.debug(f'Дата/время открытия бара {dt_open} за границами диапазона {p.fromdate} -
+            # {p.todate}')
             return False  # то бар не соответствует условиям выборки
         if (
-            self.p.sessionstart != time.min and dt_open.time() < self.p.sessionstart
+            self.check_sessionstart and dt_open.time() < p.sessionstart
         ):  # Если задано время начала сессии и открытие бара до этого времени
-            self.logger.debug(f"Дата/время открытия бара {dt_open} до начала торговой сессии {self.p.sessionstart}")
+            self.logger.debug(f"Дата/время открытия бара {dt_open} до начала торговой сессии {p.sessionstart}")
             return False  # то бар не соответствует условиям выборки
         dt_close = self.get_bar_close_date_time(dt_open)  # Дата и время закрытия бара
         if (
-            self.p.sessionend != time(23, 59, 59, 999990) and dt_close.time() > self.p.sessionend
+            self.check_sessionend and dt_close.time() > p.sessionend
         ):  # Если задано время окончания сессии и закрытие бара после этого времени
-            self.logger.debug(f"Дата/время открытия бара {dt_open} после окончания торговой сессии {self.p.sessionend}")
+            self.logger.debug(f"Дата/время открытия бара {dt_open} после окончания торговой сессии {p.sessionend}")
             return False  # то бар не соответствует условиям выборки
-        if (
-            not self.p.four_price_doji and bar["high"] == bar["low"]
-        ):  # Если не пропускаем дожи 4-х цен, но такой бар пришел
+        if not p.four_price_doji and bar.high == bar.low:  # Если не пропускаем дожи 4-х цен, но такой бар пришел
             self.logger.debug(f"Бар {dt_open} - дожи 4-х цен")
             return False  # то бар не соответствует условиям выборки
-        time_market_now = self.get_alor_date_time_now()  # Текущее биржевое время
+        if time_market_now is None:  # Если текущее биржевое время не задано
+            time_market_now = self.get_alor_date_time_now()  # то получаем его
         if (
-            dt_close > time_market_now and time_market_now.time() < self.p.sessionend
+            dt_close > time_market_now and time_market_now.time() < p.sessionend
         ):  # Если время закрытия бара еще не наступило на бирже, и сессия еще не закончилась
             self.logger.debug(f"Дата/время {dt_close} закрытия бара еще не наступило")
             return False  # то бар не соответствует условиям выборки
@@ -438,28 +495,48 @@ class Data(with_metaclass(MetaData, AbstractDataBase)):
 
     def save_bar_to_file(self, bar) -> None:
         """Сохранение бара в конец файла"""
+        self.save_bars_to_file((bar,))
+
+    def save_bars_to_file(self, bars) -> None:
+        """Сохранение бар в конец файла. Файл открывается один раз на все бары"""
+        if not bars:  # Если бар нет
+            return  # то выходим, дальше не продолжаем
         if not os.path.isfile(self.file_name):  # Существует ли файл
             self.logger.warning(f"Файл {self.file_name} не найден и будет создан")
             with open(self.file_name, "w", newline="") as file:  # Создаем файл
                 writer = csv.writer(file, delimiter=self.delimiter)  # Данные в строке разделены табуляцией
-                writer.writerow(bar.keys())  # Записываем заголовок в файл
+                writer.writerow(Bar._fields)  # Записываем заголовок в файл
 
         with open(self.file_name, "a", newline="") as file:
             # Открываем файл на добавление в конец. Ставим newline, чтобы в Windows не создавались пустые
             # строки в файле
             writer = csv.writer(file, delimiter=self.delimiter)  # Данные в строке разделены табуляцией
-            csv_row = bar.copy()  # Копируем бар для того, чтобы изменить формат даты
-            csv_row["datetime"] = csv_row["datetime"].strftime(self.dt_format)  # Приводим дату к формату файла
-            writer.writerow(csv_row.values())  # Записываем бар в конец файла
-            self.logger.debug(f'В файл {self.file_name} записан бар на {csv_row["datetime"]}')
+            dt_format = self.dt_format  # Формат даты файла
+            writer.writerows(
+                (bar.datetime.strftime(dt_format), *bar[1:]) for bar in bars
+            )  # Записываем бары в конец файла. Дату приводим к формату файла
+            self.logger.debug(
+                f"В файл {self.file_name} записано бар: {len(bars)} по {bars[-1].datetime.strftime(dt_format)}"
+            )
 
     def get_alor_date_time_now(self) -> datetime:
         """Текущая дата и время
         - Если получили последний бар истории, то запрашием текущие дату и время с сервера Алор
         - Если находимся в режиме получения истории, то переводим текущие дату и время с компьютера в МСК
+        Полученное значение используется повторно в течение time_now_ttl секунд, если источник времени не менялся
         """
-        return (
+        # Последнее полученное текущее биржевое время
+        cache_monotonic, cache_last_bar_received, cache_time_now = self.time_now_cache
+        if (
+            cache_time_now is not None
+            and cache_last_bar_received == self.last_bar_received
+            and monotonic() - cache_monotonic < self.time_now_ttl
+        ):  # Если оно получено из того же источника и не устарело
+            return cache_time_now  # то возвращаем его
+        time_now = (
             self.store.provider.utc_timestamp_to_msk_datetime(self.store.provider.get_time())
             if self.last_bar_received
             else datetime.now(self.store.provider.tz_msk).replace(tzinfo=None)
         )
+        self.time_now_cache = (monotonic(), self.last_bar_received, time_now)  # Запоминаем текущее биржевое время
+        return time_now
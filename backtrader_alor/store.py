@@ -1,5 +1,6 @@
 import logging
-from collections import deque
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor  # Пул потоков для одновременного получения истории
 
 from alor import Alor
 from backtrader.metabase import MetaParams
@@ -28,6 +29,7 @@ class Store(with_metaclass(MetaSingleton, object)):
 
     BrokerCls = None  # Класс брокера будет задан из брокера
     DataCls = None  # Класс данных будет задан из данных
+    history_workers = 8  # Максимальное кол-во потоков получения истории
 
     @classmethod
     def getdata(cls, *args, **kwargs):
@@ -43,12 +45,12 @@ class Store(with_metaclass(MetaSingleton, object)):
         super(Store, self).__init__()
         self.notifs = deque()  # Уведомления хранилища
         self.provider = provider  # Подключаемся ко всем торговым счетам
-        self.new_bars = []  # Новые бары по всем подпискам на тикеры из Алор
+        # Очереди новых бар из Алор по guid подписки/расписания. Удаляют данные при остановке. Пишет поток
+        # WebSocket/расписания, читают данные. Блокировки не нужны: deque.append/popleft и dict.setdefault атомарны
+        self.new_bars = {}
 
     def start(self):
-        self.provider.on_new_bar = lambda response: self.new_bars.append(
-            dict(guid=response["guid"], data=response["data"])
-        )  # Обработчик новых баров по подписке из Алор
+        self.provider.on_new_bar = self.on_new_bar  # Обработчик новых баров по подписке из Алор
         # События WebSocket Thread/Task для понимания, что происходит с провайдером
         self.provider.on_entering = lambda: self.logger.info("WebSocket Thread: Запуск")
         self.provider.on_enter = lambda: self.logger.info("WebSocket Thread: Запущен")
@@ -63,6 +65,38 @@ class Store(with_metaclass(MetaSingleton, object)):
         self.provider.on_cancel = lambda: self.logger.info("WebSocket Task: Отмена")
         self.provider.on_exit = lambda: self.logger.info("WebSocket Thread: Завершение")
 
+    def preload_histories(self, datas) -> None:
+        """Одновременное получение бар из файла и истории по данным вместо последовательного при их запуске
+        Данные с общим файлом истории получают бары последовательно в одном потоке, как при запуске
+
+        :param list datas: Данные Алор
+        """
+        datas_by_file = defaultdict(list)  # Данные по файлам истории
+        for data in datas:  # Пробегаемся по всем данным
+            datas_by_file[data.file_name].append(data)  # Группируем их по файлу истории
+        if len(datas_by_file) < 2:  # Если файлов истории меньше двух
+            return  # то получать одновременно нечего. Данные получат бары при запуске
+        self.logger.debug(f"Получение истории по {len(datas)} данным из {len(datas_by_file)} файлов")
+        with ThreadPoolExecutor(max_workers=min(len(datas_by_file), self.history_workers)) as executor:
+            futures = [
+                executor.submit(self.load_histories, file_datas) for file_datas in datas_by_file.values()
+            ]  # Запускаем получение истории по каждому файлу
+            for future in futures:  # Пробегаемся по всем запросам
+                future.result()  # Дожидаемся получения истории. Ошибки пробрасываем дальше
+
+    @staticmethod
+    def load_histories(datas) -> None:
+        """Последовательное получение бар из файла и истории по данным с общим файлом истории"""
+        for data in datas:  # Пробегаемся по всем данным
+            data.load_history()  # Получаем бары из файла и истории
+
+    def on_new_bar(self, response) -> None:
+        """Новый бар по подписке из Алор. Бар сразу попадает в очередь своей подписки"""
+        guid = response["guid"]  # Код подписки
+        if guid in self.provider.subscriptions:  # Если подписка не отменена
+            # Бар может прийти раньше, чем данные получат код подписки. Поэтому очередь может создать и обработчик
+            self.new_bars.setdefault(guid, deque()).append(response["data"])
+
     def put_notification(self, msg, *args, **kwargs):
         self.notifs.append((msg, args, kwargs))
 